@@ -1,9 +1,10 @@
-from collections import defaultdict
-from collections.abc import Iterable
-import dataclasses
+from bisect import bisect_left, insort
+from collections import defaultdict, deque
+from collections.abc import Iterable, Iterator, Mapping
 from dataclasses import dataclass, field
-from enum import Enum
-from typing import Any, Dict, List, Optional, Set, Tuple, TypeVar
+from enum import IntEnum
+from itertools import accumulate
+from typing import Any, Dict, List, NamedTuple, Optional, Set, Tuple
 
 import networkx
 from networkx import DiGraph
@@ -20,29 +21,32 @@ class LayoutOptions:
 
 DEFAULT_LAYOUT = LayoutOptions()
 
-class Move(Enum):
+class Move(IntEnum):
+    """Horizontal moves of an edge, ordered by their value."""
     LEFT = 0
     NA = 1 # Not available, there are no moves
     RIGHT = 2
 
 # Type aliases
 EdgeIndex = int
-GridElem = TypeVar('GridElem')
-Grid = List[List[GridElem]]
+# A (col, row) grid cell, used for keys of per-cell dicts
+Cell = Tuple[int, int]
+# Bitmask of columns, where bit i represents column i
+ColMask = int
+EdgeMask = int
 Node = Any
 
-@dataclass(eq=True, frozen=True)
+@dataclass(eq=True, frozen=True, slots=True)
 class Edge:
     src: Node
     dst: Node
 
-@dataclass
+@dataclass(slots=True)
 class Point:
     x: int
     y: int
 
-@dataclass
-class EdgeCoord:
+class EdgeCoord(NamedTuple):
     """A coordinate used to indicate segments of an edge
     polyline in the grid. Multiple edges may appear in
     a single grid and are ordered by an index.
@@ -51,17 +55,16 @@ class EdgeCoord:
     row: int
     idx: EdgeIndex
 
-@dataclass(eq=True, frozen=True)
+@dataclass(eq=True, frozen=True, slots=True)
 class GridIndex:
     col: int
     row: int
 
-@dataclass
-class NodeSize:
+class NodeSize(NamedTuple):
     width: int
     height: int
 
-@dataclass
+@dataclass(slots=True)
 class SegmentedEdge:
     src: Node
     dst: Node
@@ -71,10 +74,16 @@ class SegmentedEdge:
     end_index: Optional[EdgeIndex] = None
     max_end_index: Optional[EdgeIndex] = None
     # Three-dimensional points so that we can handle edge segments assigned to the same coordinate.
-    points: List[EdgeCoord] = field(default_factory=lambda: [])
-    moves: List = field(default_factory=lambda: [])
-    # Scene coordinates
-    coordinates: List[Point] = field(default_factory=lambda: [])
+    points: List[EdgeCoord] = field(default_factory=list)
+    # At most two moves, kept in a tuple so that the many edges without moves share the empty tuple.
+    moves: Tuple[Move, ...] = ()
+    # Scene coordinates, as parallel lists of x and y while they are being added
+    coordinates: List[Point] = field(default_factory=list)
+    xs: List[int] = field(default_factory=list, repr=False, compare=False)
+    ys: List[int] = field(default_factory=list, repr=False, compare=False)
+    # Offset from the second to last to the last coordinate, None until there are two coordinates
+    last_dx: Optional[int] = field(default=None, init=False, repr=False, compare=False)
+    last_dy: Optional[int] = field(default=None, init=False, repr=False, compare=False)
 
     def first_move(self) -> Move:
         return self.moves[0] if self.moves else Move.NA
@@ -82,19 +91,48 @@ class SegmentedEdge:
     def last_move(self) -> Move:
         return self.moves[-1] if self.moves else Move.NA
 
-    def add_coord(self, pt: Point) -> None:
-        if len(self.coordinates) >= 2:
-            a = self.coordinates[-2]
-            b = self.coordinates[-1]
-            if b.x == a.x == pt.x:
-                # Vertical movement, replace last point
-                self.coordinates[-1] = pt
-                return
-            elif b.y == a.y == pt.y:
-                # Horizontal movement, replace last point
-                self.coordinates[-1] = pt
-                return
-        self.coordinates.append(pt)
+    def add_coord(self, x: int, y: int) -> None:
+        """Append a scene coordinate, or replace the last one if it continues a
+        vertical or horizontal movement. Call `finish_coords` once all are added.
+        """
+        xs = self.xs
+        ys = self.ys
+        if not xs:
+            xs.append(x)
+            ys.append(y)
+            return
+
+        dx = x - xs[-1]
+        dy = y - ys[-1]
+        last_dx = self.last_dx
+        last_dy = self.last_dy
+        # Both are None until there are two coordinates
+        if (last_dx is not None and last_dy is not None
+                and ((dx == 0 and last_dx == 0) or (dy == 0 and last_dy == 0))):
+            # Vertical or horizontal movement, replace last point
+            xs[-1] = x
+            ys[-1] = y
+            self.last_dx = last_dx + dx
+            self.last_dy = last_dy + dy
+        else:
+            xs.append(x)
+            ys.append(y)
+            self.last_dx = dx
+            self.last_dy = dy
+
+    def finish_coords(self) -> None:
+        """Create the Points of the added scene coordinates."""
+        self.coordinates = list(map(Point, self.xs, self.ys))
+
+@dataclass(slots=True)
+class EdgeCell:
+    """Edge segments assigned to a grid cell."""
+    # Bit i is set when edge index i is in use
+    used: EdgeMask = 0
+    segments: Dict[EdgeIndex, SegmentedEdge] = field(default_factory=dict)
+
+# Sparse grid of edge segments. Only cells that have edges assigned are present.
+EdgeGrid = Dict[Cell, EdgeCell]
 
 @dataclass
 class LayoutResult:
@@ -106,84 +144,112 @@ class EdgeLayoutState:
                  max_col: int,
                  max_row: int,
                  node_locations: Dict[Node, GridIndex]):
-        self.edge_valid: Grid[bool]
-        self.vertical_edges: Grid[Dict[EdgeIndex, SegmentedEdge]]
-        self.horizontal_edges: Grid[Dict[EdgeIndex, SegmentedEdge]]
+        # Per-row masks of the columns that are occupied by nodes
+        self.blocked_cols: List[ColMask]
+        self.vertical_edges: EdgeGrid
+        self.horizontal_edges: EdgeGrid
         # Map nodes to a grid index
         self.node_locations: Dict[Node, GridIndex] = node_locations
 
-        self.edge_valid = [ ]
-        for col in range(max_col + 2):
-            self.edge_valid.append([True] * (max_row + 1))
+        self.all_cols: ColMask = (1 << (max_col + 2)) - 1
+        self.blocked_cols = [0] * (max_row + 1)
 
-        # Building up 2d-array to mark where edges/dummy nodes can be added
+        # Mark where edges/dummy nodes can not be added
         for gi in node_locations.values():
             # edges should not overlap with existing nodes
-            self.edge_valid[gi.col][gi.row] = False
-            self.edge_valid[gi.col + 1][gi.row] = False
-
-        self.vertical_edges = []
-        self.horizontal_edges = []
-
-        # Create a 2d-array of col x row elements that hold dicts which
-        # of edge indices to SegmentedEdge
-        for _ in range(max_col + 2):
-            v_edges = []
-            h_edges = []
-            for _ in range(max_row + 3):
-                v_edges.append({})
-                h_edges.append({})
-            self.vertical_edges.append(v_edges)
-            self.horizontal_edges.append(h_edges)
+            self.blocked_cols[gi.row] |= 0b11 << gi.col
+
+        # Map (col, row) cells to the edge segments and used edge indices of the cell.
+        # Most cells never have an edge, so cells are only created when assigned.
+        self.vertical_edges = {}
+        self.horizontal_edges = {}
 
         self.in_edges: Dict[Any, List[SegmentedEdge]] = defaultdict(list)
         self.out_edges: Dict[Any, List[SegmentedEdge]] = defaultdict(list)
 
+        # Memoized free columns keyed by (start_row, end_row).
+        # Nodes do not move while routing, so the columns for a given span never change.
+        self._free_cols: Dict[Tuple[int, int], ColMask] = {}
+
+    def free_columns(self,
+                     start_row: int,
+                     end_row: int) -> ColMask:
+        """Find the columns where no rows in `[start_row, end_row)` are occupied by a node.
+        """
+        key = (start_row, end_row)
+        free = self._free_cols.get(key)
+        if free is None:
+            blocked = 0
+            for row_blocked in self.blocked_cols[start_row:end_row]:
+                blocked |= row_blocked
+            free = self.all_cols & ~blocked
+            self._free_cols[key] = free
+        return free
+
     def edge_available(self,
                        col: int,
                        start_row: int,
                        end_row: int) -> bool:
-        for idx in range(start_row, end_row):
-            if not self.edge_valid[col][idx]:
-                return False
-        return True
+        return bool(self.free_columns(start_row, end_row) >> col & 1)
+
+    def route_column(self,
+                     start_col: int,
+                     min_row: int,
+                     max_row: int) -> int:
+        """Find the column closest to `start_col` that a vertical edge segment can use to
+        pass through rows `[min_row, max_row)` without crossing a node. When the closest
+        columns on either side are equally far, the column to the right is used.
+        """
+        free = self.free_columns(min_row, max_row)
+        if free >> start_col & 1:
+            return start_col
+
+        # NB: The outer columns never hold nodes, so there is always a free column.
+        # Lowest free column to the right and highest free column to the left.
+        right = free >> start_col
+        left = free & ((1 << start_col) - 1)
+        right_col = start_col + (right & -right).bit_length() - 1 if right else None
+        left_col = left.bit_length() - 1 if left else None
+
+        if right_col is None:
+            assert left_col is not None
+            return left_col
+        if left_col is None or right_col - start_col <= start_col - left_col:
+            return right_col
+        return left_col
 
     def set_in_edge_indices(self):
         # Assign indices for in-edges
-        for _, edges in self.in_edges.items():
-            max_idx = None
-
+        for edges in self.in_edges.values():
             if len(edges) == 2:
                 # NB: In the original code they're depending on the enum value
                 #     to ensure a right-to-left sorting. Unclear if the right-to-left
                 #     ordering is required. Will preserve it.
-                # Sort by last horizontal move of each edge
-                edges = sorted(edges, key=lambda edge: edge.last_move().value, reverse=True)
+                # Sort by last horizontal move of each edge, equal moves keep their order
+                if edges[0].last_move() < edges[1].last_move():
+                    edges[0], edges[1] = edges[1], edges[0]
 
+            # Indices are 0..len-1, so the last one is the largest
+            max_idx = len(edges) - 1
             for idx, edge in enumerate(edges):
                 edge.end_index = idx
-                if max_idx is None or idx > max_idx:
-                    max_idx = idx
-            for edge in edges:
                 edge.max_end_index = max_idx
 
     def set_out_edge_indices(self):
         # Assign indices for out-edges
-        for _, edges in self.out_edges.items():
-            max_idx = None
-
+        for edges in self.out_edges.values():
             if len(edges) == 2:
                 # NB: In the original code they're depending on the enum value
                 #     to ensure a left-to-right sorting (opposite of set_in_edge_indices.
                 #     Unclear if the right-to-left ordering is required. Will preserve it.
-                #  Sort by last horizontal move of each edge
-                edges = sorted(edges, key=lambda edge: edge.first_move().value)
+                #  Sort by last horizontal move of each edge, equal moves keep their order
+                if edges[0].first_move() > edges[1].first_move():
+                    edges[0], edges[1] = edges[1], edges[0]
 
+            # Indices are 0..len-1, so the last one is the largest
+            max_idx = len(edges) - 1
             for idx, edge in enumerate(edges):
                 edge.start_index = idx
-                if max_idx is None or edge.start_index > max_idx:
-                    max_idx = edge.start_index
-            for edge in edges:
                 edge.max_start_index = max_idx
 
 def layout(dg: DiGraph,
@@ -210,9 +276,9 @@ def layout(dg: DiGraph,
     dag = to_acyclic_graph(dg, ordered_nodes)
 
     # Assign grid locations
-    max_rows, max_row = calculate_max_row(dag, ordered_nodes)
-    rows, row_to_nodes = assign_rows(ordered_nodes, max_rows, node_compare_key)
-    cols, locations, max_col = assign_columns(dag, row_to_nodes, node_compare_key)
+    max_rows, max_row = calculate_max_row(dag)
+    rows, row_to_nodes = assign_rows(ordered_nodes, max_rows, max_row, node_compare_key)
+    cols, locations, max_col = assign_columns(dag, row_to_nodes)
 
     # TODO: Maybe can just provide the horizontal_lines and vertical_lines and don't need to return
     #       the EdgeLayoutState.
@@ -220,9 +286,9 @@ def layout(dg: DiGraph,
     edge_layout_state, edges = route_edges(dg, locations, max_col, max_row)
 
     # Find max edge index for all horizontal and vertical edge segments
-    max_vertical_edge_indices: Dict[GridIndex, EdgeIndex]
+    max_vertical_edge_indices: Dict[Cell, EdgeIndex]
     max_vertical_edge_indices = calculate_max_edge_indices(edge_layout_state.vertical_edges)
-    max_horizontal_edge_indices: Dict[GridIndex, EdgeIndex]
+    max_horizontal_edge_indices: Dict[Cell, EdgeIndex]
     max_horizontal_edge_indices = calculate_max_edge_indices(edge_layout_state.horizontal_edges)
 
     # Determine the 2d grid/block sizes
@@ -275,84 +341,187 @@ def quasi_topological_sort(dg: DiGraph) -> List:
     if dg.number_of_nodes() == 1:
         return dg.nodes()
 
-    # make a copy to the graph since we are going to modify it
-    dg_copy = networkx.DiGraph()
+    ordered_nodes: List = [ ]
+
+    # Graphs whose nodes are still being appended, innermost last. Each entry holds the successors of the graph's
+    # nodes, its SCCs, an iterator over its collapsed topological order and where its nodes start in ordered_nodes.
+    # NB: Appending an SCC pushes the component with the edges into its loop head removed. It may still contain
+    #     nested cycles, so it is sorted like any other graph.
+    stack: List[Tuple[Mapping[Any, Iterable], List[List], Iterator, int]] = [(dg.succ, *_collapsed_order(dg.succ), 0)]
+    while stack:
+        succ, sccs, nodes, start = stack[-1]
+        for n in nodes:
+            if isinstance(n, SCCPlaceholder):
+                scc_succ = _break_scc(succ, ordered_nodes, start, sccs[n.scc_id])
+                stack.append((scc_succ, *_collapsed_order(scc_succ), len(ordered_nodes)))
+                break
+            ordered_nodes.append(n)
+        else:
+            stack.pop()
+
+    return ordered_nodes
+
+def _collapsed_order(succ: Mapping[Any, Iterable]) -> Tuple[List[List], Iterator]:
+    """
+    Collapse the strongly connected components of a graph and sort the resulting acyclic graph.
+
+    :param dict succ: Maps every node of the graph to its successors.
+    :return:          The SCCs of the graph, and its sorted nodes with an SCCPlaceholder in place of each SCC.
+    """
+
+    # fast path for acyclic graphs, a complete topological sort means there are no SCCs to collapse
+    ordered_nodes = _topological_sort(succ)
+    if len(ordered_nodes) == len(succ):
+        return [], iter(ordered_nodes)
 
     # TODO: This code from angr was originally supporting control- and data-flow graphs
     # Why check for SCCs in a CFG or DFG? Seems like it makes this function more general,
     # keeping it for now.
 
     # find all strongly connected components in the graph
-    sccs = [scc for scc in networkx.strongly_connected_components(dg) if len(scc) > 1]
+    sccs = [scc for scc in _strongly_connected_components(succ) if len(scc) > 1]
+
+    # Create one placeholder per SCC and map nodes to the placeholder of their SCC
+    placeholders = [SCCPlaceholder(idx) for idx in range(len(sccs))]
+    node_placeholder = {n: placeholders[idx] for idx, scc in enumerate(sccs) for n in scc}
+
+    # collapse all strongly connected components into an acyclic adjacency map
+    # NB: Placeholders are shared, so an identity check skips both self-loops and edges within an SCC.
+    # Edges between SCCs collapse into duplicates, only keep the first of each (in order).
+    collapsed_succ: Dict[Any, Dict[Any, None]] = {}
+    for src, succs in succ.items():
+        src = node_placeholder.get(src, src)
+        for dst in succs:
+            dst = node_placeholder.get(dst, dst)
+            if src is not dst:
+                collapsed_succ.setdefault(src, {})[dst] = None
+                collapsed_succ.setdefault(dst, {})
+
+    # add loners, including nodes whose only edges are self-loops
+    for node in succ:
+        if node not in collapsed_succ and node not in node_placeholder:
+            collapsed_succ[node] = {}
+    # and SCCs without edges to the rest of the graph
+    for placeholder in placeholders:
+        collapsed_succ.setdefault(placeholder, {})
+
+    # topological sort on the acyclic collapsed graph
+    return sccs, iter(_topological_sort(collapsed_succ))
+
+def _strongly_connected_components(succ: Mapping[Any, Iterable]) -> List[List]:
+    """
+    Find the strongly connected components of a graph with an iterative version of Tarjan's algorithm.
 
-    # Assign indices to SCCs and map nodes to their respective SCC indices
-    node_scc_index = {n: idx for idx, scc in enumerate(sccs) for n in scc}
+    Each component starts with the node it was first entered at, followed by the nodes in the order they were
+    closed. Components are found in reverse topological order.
 
-    # collapse all strongly connected components
-    for src, dst in dg.edges():
-        scc_index = node_scc_index.get(src)
-        if scc_index is not None:
-            src = SCCPlaceholder(scc_index)
-        scc_index = node_scc_index.get(dst)
-        if scc_index is not None:
-            dst = SCCPlaceholder(scc_index)
-
-        if isinstance(src, SCCPlaceholder) and isinstance(dst, SCCPlaceholder) and src == dst:
-            continue
-        if src == dst:
+    :param dict succ: Maps every node of the graph to its successors.
+    :return:          A list of strongly connected components.
+    :rtype: list
+    """
+
+    preorder: Dict[Any, int] = {}
+    lowlink: Dict[Any, int] = {}
+    scc_found: Set = set()
+    scc_queue: List = [ ]
+    sccs: List[List] = [ ]
+    neighbors = {node: iter(succs) for node, succs in succ.items()}
+
+    for source in succ:
+        if source in scc_found:
             continue
+        queue = [source]
+        while queue:
+            node = queue[-1]
+            if node not in preorder:
+                preorder[node] = len(preorder) + 1
+
+            # Descend into the first unvisited successor
+            for succ_node in neighbors[node]:
+                if succ_node not in preorder:
+                    queue.append(succ_node)
+                    break
+            else:
+                # All successors are visited, close the node
+                queue.pop()
+                low = preorder[node]
+                for succ_node in succ[node]:
+                    if succ_node not in scc_found:
+                        if preorder[succ_node] > preorder[node]:
+                            low = min(low, lowlink[succ_node])
+                        else:
+                            low = min(low, preorder[succ_node])
+                lowlink[node] = low
+
+                if low == preorder[node]:
+                    scc = [node]
+                    while scc_queue and preorder[scc_queue[-1]] > preorder[node]:
+                        scc.append(scc_queue.pop())
+                    scc_found.update(scc)
+                    sccs.append(scc)
+                else:
+                    scc_queue.append(node)
 
-        dg_copy.add_edge(src, dst)
+    return sccs
 
-    # add loners
-    out_degree_zero_nodes = [node for (node, degree) in dg.out_degree() if degree == 0]
-    for node in out_degree_zero_nodes:
-        if dg.in_degree(node) == 0:
-            dg_copy.add_node(node)
+def _topological_sort(succ: Mapping[Any, Iterable]) -> List:
+    """
+    Sort the nodes of an acyclic graph with Kahn's algorithm.
 
-    # topological sort on acyclic graph `dg_copy`
-    tmp_nodes = networkx.topological_sort(dg_copy)
+    Nodes without predecessors are visited in the order of `succ`, and the nodes they free up are visited in the
+    order they were freed, the same order networkx.topological_sort produces.
 
+    If the graph has cycles, nodes on or reachable from a cycle are left out of the result.
+
+    :param dict succ: Maps every node of the graph to its successors.
+    :return:          A list of ordered nodes.
+    :rtype: list
+    """
+
+    indegree = dict.fromkeys(succ, 0)
+    for succs in succ.values():
+        for succ_node in succs:
+            indegree[succ_node] += 1
+
+    queue = deque(node for node, degree in indegree.items() if degree == 0)
     ordered_nodes = [ ]
-    for n in tmp_nodes:
-        if isinstance(n, SCCPlaceholder):
-            _append_scc(dg, ordered_nodes, sccs[n.scc_id])
-        else:
-            ordered_nodes.append(n)
+    while queue:
+        node = queue.popleft()
+        ordered_nodes.append(node)
+        for succ_node in succ[node]:
+            indegree[succ_node] -= 1
+            if indegree[succ_node] == 0:
+                queue.append(succ_node)
 
     return ordered_nodes
 
-def _append_scc(graph, ordered_nodes, scc):
+def _break_scc(succ: Mapping[Any, Iterable], ordered_nodes: List, start: int, scc: List) -> Dict[Any, List]:
     """
-    Append all nodes from a strongly connected component to a list of ordered nodes and ensure the topological
-    order.
+    Pick the loop head of a strongly connected component and break its cycles through the loop head.
 
-    :param networkx.DiGraph graph: The graph where all nodes belong to.
-    :param list ordered_nodes:     Ordered nodes.
-    :param iterable scc:           A set of nodes that forms a strongly connected component in the graph.
-    :return:                       None
+    :param dict succ:          Maps every node of the graph the component belongs to to its successors.
+    :param list ordered_nodes: Ordered nodes.
+    :param int start:          Where the nodes of the component's graph start in `ordered_nodes`.
+    :param list scc:           The nodes that form a strongly connected component in the graph.
+    :return:                   The successors of each node of the component, without the edges into the loop head.
     """
 
     # find the first node in the strongly connected component that is the successor to any node in ordered_nodes
     loop_head = None
-    for parent_node in reversed(ordered_nodes):
-        for n in scc:
-            if n in graph[parent_node]:
-                loop_head = n
-                break
-
-        if loop_head is not None:
+    scc_set = set(scc)
+    for idx in range(len(ordered_nodes) - 1, start - 1, -1):
+        parent_succs = succ[ordered_nodes[idx]]
+        if not scc_set.isdisjoint(parent_succs):
+            # Prefer the component's own ordering if the parent has several successors in it
+            loop_head = next(n for n in scc if n in parent_succs)
             break
 
     if loop_head is None:
-        # randomly pick one
-        loop_head = next(iter(scc))
+        # pick the node the component was entered at
+        loop_head = scc[0]
 
-    subgraph: DiGraph = graph.subgraph(scc).copy()
-    for src, _ in list(subgraph.in_edges(loop_head)):
-        subgraph.remove_edge(src, loop_head)
-
-    ordered_nodes.extend(quasi_topological_sort(subgraph))
+    return {n: [succ_node for succ_node in succ[n] if succ_node in scc_set and succ_node != loop_head]
+            for n in scc}
 
 class SCCPlaceholder:
     __slots__ = ['scc_id']
@@ -364,7 +533,7 @@ class SCCPlaceholder:
         return isinstance(other, SCCPlaceholder) and other.scc_id == self.scc_id
 
     def __hash__(self):
-        return hash('scc_placeholder_%d' % self.scc_id)
+        return hash(self.scc_id)
 
 def to_acyclic_graph(dg: DiGraph, ordered_nodes=None):
     """
@@ -379,47 +548,54 @@ def to_acyclic_graph(dg: DiGraph, ordered_nodes=None):
         # take the quasi-topological order of the graph
         ordered_nodes = quasi_topological_sort(dg)
 
+    rank = {node: idx for idx, node in enumerate(ordered_nodes)}
+
     dag = networkx.DiGraph()
+    dag.add_nodes_from(ordered_nodes)
 
-    # add each node and its edge into the graph
-    visited = set()
-    for node in ordered_nodes:
-        visited.add(node)
-        dag.add_node(node)
-        for successor in dg.successors(node):
-            if successor not in visited:
-                dag.add_edge(node, successor)
+    # add each edge that points forward in the order into the graph.
+    # NB: Edges are added in node order so that predecessor order follows `ordered_nodes`.
+    succ = dg.succ
+    dag.add_edges_from((node, successor)
+                       for node in ordered_nodes
+                       for successor in succ[node]
+                       if rank[node] < rank[successor])
 
     return dag
 
-def calculate_max_row(dag: DiGraph, ordered_nodes: Iterable) -> Tuple[Dict[Node, int], int]:
-    """Calculate the maximum row ID using DFS.
+def calculate_max_row(dag: DiGraph) -> Tuple[Dict[Node, int], int]:
+    """Calculate the row of each node, the longest path to it from a root, by
+    propagating rows in topological order. Every edge is visited once.
     """
-    max_row = 0
-    max_rows = {}
-
-    for node in ordered_nodes:
-        if node not in max_rows:
-            max_rows[node] = 0
-        row = max_rows[node]
-        max_row = max(max_row, row)
-        for succ in dag.successors(node):
-            if succ not in max_rows or max_rows[succ] < row + 1:
-                max_rows[succ] = row + 1
-                max_row = max(max_row, row + 1)
-
-    return max_rows, max_row
+    succ = dag.succ
+    indegree = {node: len(preds) for node, preds in dag.pred.items()}
+    max_rows = {node: 0 for node, degree in indegree.items() if degree == 0}
+    queue = deque(max_rows)
+
+    while queue:
+        node = queue.popleft()
+        succ_row = max_rows[node] + 1
+        for succ_node in succ[node]:
+            if max_rows.get(succ_node, -1) < succ_row:
+                max_rows[succ_node] = succ_row
+            indegree[succ_node] -= 1
+            if indegree[succ_node] == 0:
+                queue.append(succ_node)
+
+    return max_rows, max(max_rows.values(), default=0)
 
 def assign_rows(ordered_nodes: List[Node],
                 max_rows: Dict[Node, int],
-                node_compare_key) -> Tuple[Dict[Node, int], Dict[int, List]]:
-    """Assign nodes to rows and provide a mapping to lookup all nodes given a
-    row index.
+                max_row: int,
+                node_compare_key) -> Tuple[Dict[Node, int], List[List[Node]]]:
+    """Assign nodes to rows and provide a list of the nodes in each row, indexed
+    by row.
     """
 
     # TODO: Isn't this rows Dict just a copy of max_rows?
     rows: Dict[Node, int] = {}
-    row_to_nodes: Dict[int, List[Node]] = defaultdict(list)
+    # NB: Every row below the first has a node with a predecessor in the row above, so rows are dense.
+    row_to_nodes: List[List[Node]] = [[] for _ in range(max_row + 1)]
 
     for node in ordered_nodes:
         # Push each node as far up as possible, unless it is the terminal node
@@ -428,41 +604,47 @@ def assign_rows(ordered_nodes: List[Node],
         row_to_nodes[row].append(node)
 
     # Sort the nodes within a row
-    row_to_nodes = {row: sorted(nodes, key=node_compare_key)
-                    for row, nodes in row_to_nodes.items()}
+    for nodes in row_to_nodes:
+        nodes.sort(key=node_compare_key)
 
     return rows, row_to_nodes
 
 def assign_columns(dag: DiGraph,
-                   row_to_nodes: Dict[int, List],
-                   node_compare_key) -> Tuple[Dict[Node, int], Dict[Node, GridIndex], int]:
+                   row_to_nodes: List[List[Node]]) -> Tuple[Dict[Node, int], Dict[Node, GridIndex], int]:
     """Assign nodes to columns and provide a mapping of nodes to a grid location, including
-    the index within the grid cell.
+    the index within the grid cell. The nodes of each row are expected to be sorted, as
+    provided by `assign_rows`.
     """
     cols: Dict[Node, int] = {}
     locations: Dict[Node, GridIndex] = {}
     global_max_col = 0
 
+    # Look up neighbors once rather than going through networkx for every node in both passes.
+    # NB: The adjacency order is preserved as the column bounds below depend on it.
+    succs_of: Dict[Node, List[Node]] = {n: list(succs) for n, succs in dag.succ.items()}
+    preds_of: Dict[Node, List[Node]] = {n: list(preds) for n, preds in dag.pred.items()}
+
     # Assign initial column ID fromm bottom-up.
     # I.e., starting at the bottom rows.
-    for row_idx in reversed(list(row_to_nodes.keys())):
-        row_nodes = sorted(row_to_nodes[row_idx], key=node_compare_key)
+    for row_idx in range(len(row_to_nodes) - 1, -1, -1):
+        row_nodes = row_to_nodes[row_idx]
 
         next_min_col = 1
         next_max_col = 2
 
         for node_idx, node in enumerate(row_nodes):
-            succs = dag.successors(node)
+            succs = succs_of[node]
             min_col = None
             max_col = None
 
             for succ in succs:
-                if succ in cols:
-                    succ_col = cols[succ]
-                    if min_col is None or succ_col < min_col:
-                        min_col = succ_col
-                    if max_col is None or succ_col > max_col:
-                        max_col = succ_col + 1
+                succ_col = cols.get(succ)
+                if succ_col is None:
+                    continue
+                if min_col is None or succ_col < min_col:
+                    min_col = succ_col
+                if max_col is None or succ_col > max_col:
+                    max_col = succ_col + 1
 
             if min_col is None and max_col is None:
                 min_col = next_min_col
@@ -490,12 +672,16 @@ def assign_columns(dag: DiGraph,
             next_max_col = next_min_col + 1
 
     # Adjust columns by top-down
-    for row_idx, row_nodes in row_to_nodes.items():
+    for row_idx, row_nodes in enumerate(row_to_nodes):
         next_min_col = None
         next_max_col = None
 
+        # (column, row position, node) entries sorted by column. Ties keep the row order.
+        # Kept sorted as nodes are moved so that overlap detection does not need to re-sort.
+        sorted_row = sorted((cols[n], idx, n) for idx, n in enumerate(row_nodes))
+
         for idx, node in enumerate(row_nodes):
-            preds = list(dag.predecessors(node))
+            preds = preds_of[node]
             if len(preds) < 2:
                 # Not enough predecessors to process
                 col = cols[node]
@@ -507,19 +693,24 @@ def assign_columns(dag: DiGraph,
             max_col = next_max_col
 
             for pred in preds:
-                if pred in cols:
-                    pred_col = cols[pred]
-                    if min_col is None or min_col > pred_col:
-                        min_col = pred_col
-                    if max_col is None or max_col < pred_col:
-                        max_col = pred_col + 1
+                pred_col = cols.get(pred)
+                if pred_col is None:
+                    continue
+                if min_col is None or min_col > pred_col:
+                    min_col = pred_col
+                if max_col is None or max_col < pred_col:
+                    max_col = pred_col + 1
 
             # Try to align this node with predecessors and prevent overlaps
             # The min_col and max_col are defined by the predecessors
             assert(min_col is not None)
             assert(max_col is not None)
             col = (min_col + max_col) // 2
-            has_overlap, col = detect_overlap(node, cols, col, row_nodes, min_col)
+            has_overlap, col = detect_overlap(node, col, sorted_row, min_col)
+
+            # Move the node to its new position in the sorted row
+            del sorted_row[bisect_left(sorted_row, (cols[node], idx))]
+            insort(sorted_row, (col, idx, node))
 
             # Assign a column ID to the current node
             cols[node] = col
@@ -533,32 +724,34 @@ def assign_columns(dag: DiGraph,
     return cols, locations, global_max_col + 1
 
 def detect_overlap(node,
-                   cols: Dict[Node, int],
                    ideal_col: int,
-                   row_nodes: List[Node],
+                   sorted_row: List[Tuple[int, int, Node]],
                    min_col: int) -> Tuple[bool, int]:
-    overlap_detected = False
-    suggested_col = min_col
+    """Check if `node` overlaps with another node in its row when placed at `ideal_col`
+    and suggest a column if so. `sorted_row` holds `(column, row position, node)` entries
+    for every node in the row, sorted by column.
+    """
+    # Check for overlap, only nodes within one column of the ideal column can collide
+    lo = bisect_left(sorted_row, (ideal_col - 1,))
+    hi = bisect_left(sorted_row, (ideal_col + 2,))
+    if all(sorted_row[i][2] is node for i in range(lo, hi)):
+        return False, ideal_col
 
-    # Check for overlap
-    for row_node in sorted(row_nodes, key=lambda n: cols[n]):
+    # Detected collision, find the first gap at or after min_col.
+    # Nodes left of min_col - 1 can not affect the suggestion.
+    suggested_col = min_col
+    for i in range(bisect_left(sorted_row, (min_col - 1,)), len(sorted_row)):
+        row_node_col, _, row_node = sorted_row[i]
         if row_node is node:
             continue
-        row_node_col = cols[row_node]
-        if row_node_col - 1 <= ideal_col <= row_node_col + 1:
-            # Detected collision
-            overlap_detected = True
+        if suggested_col < row_node_col - 1:
+            # Have a working suggestion
+            break
         if row_node_col - 1 <= suggested_col <= row_node_col + 1:
             # Adjust suggestion
             suggested_col = row_node_col + 2
-        if overlap_detected and suggested_col < row_node_col - 1:
-            # Have a working suggestion
-            break
 
-    if overlap_detected:
-        return True, suggested_col
-    else:
-        return False, ideal_col
+    return True, suggested_col
 
 def route_edges(dg: DiGraph,
                 node_locations: Dict[Node, GridIndex],
@@ -617,17 +810,7 @@ def route_edge(state: EdgeLayoutState,
         min_row = end_row
 
     # Find a vertical column to route edge to target node
-    col = start_col
-    if not state.edge_available(col, min_row, max_row):
-        offset = 1
-        while True:
-            if state.edge_available(col + offset, min_row, max_row):
-                col = col + offset
-                break
-            if state.edge_available(col - offset, min_row, max_row):
-                col = col - offset
-                break
-            offset += 1
+    col = state.route_column(start_col, min_row, max_row)
 
     # If column changed, we need a horizontal line to connect them
     if col != start_col:
@@ -646,7 +829,7 @@ def route_edge(state: EdgeLayoutState,
                                           start_row,
                                           max_col - min_col)
         edge.points.append(EdgeCoord(col, start_row, edge_idx))
-        edge.moves.append(move)
+        edge.moves += (move,)
     else:
         # We will also have a horizontal edge here just in case the two blocks don't align
         assign_horizontal_edge(state.horizontal_edges,
@@ -681,7 +864,7 @@ def route_edge(state: EdgeLayoutState,
                                           end_row,
                                           max_col - min_col)
         edge.points.append(EdgeCoord(end_col, end_row, edge_idx))
-        edge.moves.append(move)
+        edge.moves += (move,)
 
         # Move downwards
         # In a new grid cell, need a new edge index
@@ -697,89 +880,75 @@ def route_edge(state: EdgeLayoutState,
 
     return edge, state
 
-def first_unused_index(indices: Set[int]) -> int:
-    sorted_indices = sorted(indices)
-
-    # Find first unused index
-    if not sorted_indices:
-        # No used indices
-        return 0
-    elif len(sorted_indices) == 1:
-        # One used index
-        # It should be the case that a lone index is always 0
-        # TODO: Is that true?
-        assert(sorted_indices[0] == 0)
-        return 1
-    else:
-        # TODO: Gaps could come in because of minimizing edge overlap?
-        # Check for gaps
-        for prev_idx, next_idx in zip(sorted_indices[:-1], sorted_indices[1:]):
-            if prev_idx + 1 != next_idx:
-                # Gap found
-                return prev_idx + 1
-    # If we make it here, append a new index to the end
-    return sorted_indices[-1] + 1
-
-def assign_vertical_edge(vertical_edges: Grid[Dict[EdgeIndex, SegmentedEdge]],
+def first_unused_index(used: EdgeMask) -> EdgeIndex:
+    """Find the lowest edge index that is not set in the `used` mask.
+    """
+    unused = ~used
+    return (unused & -unused).bit_length() - 1
+
+def assign_vertical_edge(vertical_edges: EdgeGrid,
                          edge: SegmentedEdge,
                          col: int,
                          row: int,
                          num_blocks: int) -> EdgeIndex:
 
     # Find available index
-    indices: Set[EdgeIndex] = set()
+    used: EdgeMask = 0
     start_row = row
     end_row = row + num_blocks
     for r in range(start_row, end_row + 1):
-        if vertical_edges[col][r]:
-            indices.update(vertical_edges[col][r].keys())
-    edge_index = first_unused_index(indices)
+        cell = vertical_edges.get((col, r))
+        if cell is not None:
+            used |= cell.used
+    edge_index = first_unused_index(used)
 
+    edge_bit = 1 << edge_index
     for r in range(start_row, end_row + 1):
-        vertical_edges[col][r][edge_index] = edge
+        cell = vertical_edges.get((col, r))
+        if cell is None:
+            cell = vertical_edges[(col, r)] = EdgeCell()
+        cell.used |= edge_bit
+        cell.segments[edge_index] = edge
 
     return edge_index
 
-def assign_horizontal_edge(horizontal_edges: Grid[Dict[EdgeIndex, SegmentedEdge]],
+def assign_horizontal_edge(horizontal_edges: EdgeGrid,
                            edge: SegmentedEdge,
                            col: int,
                            row: int,
                            num_blocks: int) -> EdgeIndex:
 
     # Find available index
-    indices: Set[EdgeIndex] = set()
+    used: EdgeMask = 0
     start_col = col
     end_col = col + num_blocks
     for c in range(start_col, end_col + 1):
-        if horizontal_edges[c][row]:
-            indices.update(horizontal_edges[c][row].keys())
-    edge_index = first_unused_index(indices)
+        cell = horizontal_edges.get((c, row))
+        if cell is not None:
+            used |= cell.used
+    edge_index = first_unused_index(used)
 
+    edge_bit = 1 << edge_index
     for c in range(start_col, end_col + 1):
-        horizontal_edges[c][row][edge_index] = edge
+        cell = horizontal_edges.get((c, row))
+        if cell is None:
+            cell = horizontal_edges[(c, row)] = EdgeCell()
+        cell.used |= edge_bit
+        cell.segments[edge_index] = edge
 
     return edge_index
 
-def calculate_max_edge_indices(edges: Grid[Dict[EdgeIndex, SegmentedEdge]]) -> Dict[GridIndex, EdgeIndex]:
+def calculate_max_edge_indices(edges: EdgeGrid) -> Dict[Cell, EdgeIndex]:
     """Find the largest edge index used for each grid cell.
     """
 
-    result: Dict[GridIndex, EdgeIndex] = {}
-
-    for col, row_edges in enumerate(edges):
-        for row, edge_segments in enumerate(row_edges):
-            if not edge_segments:
-                continue
-            grid_index = GridIndex(col, row)
-            result[grid_index] = max(edge_segments.keys())
-
-    return result
+    return {loc: cell.used.bit_length() - 1 for loc, cell in edges.items()}
 
 
 def make_grids(max_row: int,
                max_col: int,
-               max_vedge_indices: Dict[GridIndex, EdgeIndex],
-               max_hedge_indices: Dict[GridIndex, EdgeIndex],
+               max_vedge_indices: Dict[Cell, EdgeIndex],
+               max_hedge_indices: Dict[Cell, EdgeIndex],
                nodes: Iterable,
                locations: Dict[Node, GridIndex],
                sizes: Dict[Node, NodeSize],
@@ -792,32 +961,36 @@ def make_grids(max_row: int,
     col_widths = [0] * (max_col + 2)
 
     # Update grid sizes based on nodes
+    # NB: Nodes are centered across two columns, each column holds half of the node.
+    num_cols = len(col_widths)
     for node in nodes:
         loc = locations[node]
         size = sizes[node]
+        col = loc.col
+        half_width = size.width // 2
 
         if row_heights[loc.row] < size.height:
             row_heights[loc.row] = size.height
 
-        if col_widths[loc.col] < size.width // 2:
-            col_widths[loc.col] = size.width // 2
-        next_col = loc.col + 1
-        if (next_col < len(col_widths) and
-            col_widths[next_col] < size.width // 2):
-            col_widths[next_col] = size.width // 2
+        if col_widths[col] < half_width:
+            col_widths[col] = half_width
+        next_col = col + 1
+        if next_col < num_cols and col_widths[next_col] < half_width:
+            col_widths[next_col] = half_width
 
     # Update grid sizes based on edges
-    for col in range(len(col_widths)):
-        for row in range(len(row_heights)):
-            grid_idx = GridIndex(col, row)
-            if grid_idx in max_vedge_indices:
-                col_width = (max_vedge_indices[grid_idx] + 2) * x_margin
-                if col_widths[col] < col_width:
-                    col_widths[col] = col_width
-            if grid_idx in max_hedge_indices:
-                row_height = (max_hedge_indices[grid_idx] + 2) * y_margin
-                if row_heights[row] < row_height:
-                    row_heights[row] = row_height
+    # NB: Edge segments may extend into cells past the grid, those do not affect the sizes.
+    num_rows = len(row_heights)
+    for (col, row), max_idx in max_vedge_indices.items():
+        if col < num_cols and row < num_rows:
+            col_width = (max_idx + 2) * x_margin
+            if col_widths[col] < col_width:
+                col_widths[col] = col_width
+    for (col, row), max_idx in max_hedge_indices.items():
+        if col < num_cols and row < num_rows:
+            row_height = (max_idx + 2) * y_margin
+            if row_heights[row] < row_height:
+                row_heights[row] = row_height
 
     # The left-most and right-most columns do not have nodes assigned.
     # But they may have edges assigned. Ensure a minimum width.
@@ -826,7 +999,8 @@ def make_grids(max_row: int,
 
     return row_heights, col_widths
 
-def find_nonintersecting_y(grid_coords: Dict[GridIndex, Point],
+def find_nonintersecting_y(grid_xs: List[int],
+                           grid_ys: List[int],
                            row_heights: List[int],
                            row: int,
                            starting_col: int,
@@ -835,9 +1009,9 @@ def find_nonintersecting_y(grid_coords: Dict[GridIndex, Point],
     """
     Find the y-coordinate for a point on an edge that will not lead to the edge segment
     intersecting with any nodes betweeng `starting_col` and `ending_col`.
-    """
-    max_y = None
 
+    The grid scene coordinates are indexed from column/row -1, see `calculate_coordinates`.
+    """
     if starting_col <= next_col:
         min_col = starting_col
         max_col = next_col
@@ -845,25 +1019,20 @@ def find_nonintersecting_y(grid_coords: Dict[GridIndex, Point],
         min_col = next_col
         max_col = starting_col
 
-    # Find all grids in range and use to push to a larger y-coordinate (move down in the scene)
-    for col in range(min_col, max_col + 1):
-        key = GridIndex(col, row)
-        if key not in grid_coords:
-            continue
-        pt = grid_coords[key]
-        new_y = pt.y + row_heights[row]
-        if max_y is None or new_y > max_y:
-            max_y = new_y
+    # All grids in a row share a y-coordinate. If any grid is in range, use it to push
+    # to a larger y-coordinate (move down in the scene)
+    if min_col <= len(grid_xs) - 2 and max_col >= -1:
+        return grid_ys[row + 1] + row_heights[row]
 
-    return max_y if max_y is not None else default_y
+    return default_y
 
 def calculate_coordinates(max_row: int,
                           max_col: int,
                           row_heights: List[int],
                           col_widths: List[int],
                           locations: Dict[Node, GridIndex],
-                          max_vedge_indices: Dict[GridIndex, EdgeIndex],
-                          max_hedge_indices: Dict[GridIndex, EdgeIndex],
+                          max_vedge_indices: Dict[Cell, EdgeIndex],
+                          max_hedge_indices: Dict[Cell, EdgeIndex],
                           row_margin: int,
                           col_margin: int,
                           # x_margin and y_margin are edge margins?
@@ -873,13 +1042,13 @@ def calculate_coordinates(max_row: int,
                           node_sizes: Dict[Node, NodeSize],
                           edges: List[SegmentedEdge]) -> LayoutResult:
     row_max_idxs: Dict[int, EdgeIndex] = {}
-    grid_coords: Dict[GridIndex, Point] = {}
     node_coords: Dict[Node, Point] = {}
+    node_center_xs: Dict[Node, int] = {}
 
     # Find the max edge indices for each of the rows
-    for loc, loc_max_idx in max_hedge_indices.items():
-        row_max_idxs[loc.row] = max(loc_max_idx, row_max_idxs[loc.row]) \
-            if loc.row in row_max_idxs else loc_max_idx
+    for (_, row), loc_max_idx in max_hedge_indices.items():
+        if loc_max_idx > row_max_idxs.get(row, -1):
+            row_max_idxs[row] = loc_max_idx
 
     # Calculate the top margin based on number of horzontal edges above
     top_margin = row_margin * 2
@@ -887,28 +1056,29 @@ def calculate_coordinates(max_row: int,
         # TODO: Why the +2 Is this something like there should always be at least the equivalent of
         #       two edges for computing margins?
         top_margin += y_margin * (row_max_idxs[0] + 2)
-    y = top_margin
-
-    # Calculate the grid scene coordinates
-    for row in range(-1, max_row + 2):
-        x = 0
-        for col in range(-1, max_col + 2):
-            grid_coords[GridIndex(col, row)] = Point(x, y)
-            x += col_widths[col] + col_margin
-        # TODO: Should row_heights be a defaultdict(0)?
-        if row_heights[row] is None:
-            row_heights[row] = 0
 
+    def row_span(row: int) -> int:
         # Calculate the bottom margin based on the number of horizontal edges below
         bottom_margin = row_margin * 2
         if (row + 1) in row_max_idxs:
             bottom_margin += y_margin * (row_max_idxs[row + 1] + 2)
-        y += row_heights[row] + bottom_margin
+        return row_heights[row] + bottom_margin
+
+    # Calculate the grid scene coordinates
+    # The x-coordinate of a grid only depends on its column and the y-coordinate only on its row.
+    # Columns and rows start at -1, so column `col` is at `grid_xs[col + 1]` and row `row` is at
+    # `grid_ys[row + 1]`.
+    # NB: Column and row -1 use the sizes of the last column and row.
+    grid_xs = list(accumulate((col_widths[col] + col_margin for col in range(-1, max_col + 1)),
+                              initial=0))
+    grid_ys = list(accumulate((row_span(row) for row in range(-1, max_row + 1)),
+                              initial=top_margin))
 
     # Use grid coordinates to calculate node scene coordinates
     for node in nodes:
         grid_loc = locations[node]
-        grid_coord = grid_coords[grid_loc]
+        grid_x = grid_xs[grid_loc.col + 1]
+        grid_y = grid_ys[grid_loc.row + 1]
         grid_a_width = col_widths[grid_loc.col]
         grid_b_width = col_widths[grid_loc.col + 1]
         grid_height = row_heights[grid_loc.row]
@@ -916,104 +1086,109 @@ def calculate_coordinates(max_row: int,
 
         # Place the "center" of the node in the center of the grid cell.
         # NB: This horizontal position is based on the width of two columns.
-        node_coords[node] = Point(grid_coord.x + ((grid_a_width + grid_b_width) // 2 - node_size.width // 2),
-                                  grid_coord.y + (grid_height // 2 - node_size.height // 2))
+        node_x = grid_x + ((grid_a_width + grid_b_width) // 2 - node_size.width // 2)
+        node_coords[node] = Point(node_x, grid_y + (grid_height // 2 - node_size.height // 2))
+        # Edges leave and enter nodes around their horizontal center
+        node_center_xs[node] = node_x + node_size.width // 2
 
     # Use grid coordinates to calculate edge scene coordinates
     for edge in edges:
         src_loc = node_coords[edge.src]
         src_size = node_sizes[edge.src]
         dst_loc = node_coords[edge.dst]
-        dst_size = node_sizes[edge.dst]
+        points = edge.points
 
-        start_x_index = edge.points[0].idx
-        start_point_x_base = src_loc.x + src_size.width // 2 - (x_margin * (edge.max_start_index + 1) // 2)
+        start_x_index = points[0].idx
+        start_point_x_base = node_center_xs[edge.src] - (x_margin * (edge.max_start_index + 1) // 2)
         start_point_x = start_point_x_base + (start_x_index * x_margin)
-        start_point = Point(start_point_x, src_loc.y + src_size.height)
-        edge.coordinates.append(start_point)
+        start_point_y = src_loc.y + src_size.height
+        edge.add_coord(start_point_x, start_point_y)
 
-        prev_grid_coord: GridIndex = locations[edge.src]
-        prev_grid_coord = GridIndex(prev_grid_coord.col + 1,
-                               prev_grid_coord.row + 1)
+        src_grid_loc = locations[edge.src]
+        prev_col = src_grid_loc.col + 1
+        prev_row = src_grid_loc.row + 1
 
-        if len(edge.points) > 1:
-            next_point = edge.points[1]
+        if len(points) > 1:
+            next_point = points[1]
             next_col = next_point.col
             next_idx = next_point.idx
-            starting_grid_coord: GridIndex = locations[edge.src]
-            starting_row = starting_grid_coord.row
-            starting_col = starting_grid_coord.col
-            y_base = find_nonintersecting_y(grid_coords,
+            starting_row = src_grid_loc.row
+            starting_col = src_grid_loc.col
+            y_base = find_nonintersecting_y(grid_xs,
+                                            grid_ys,
                                             row_heights,
                                             starting_row,
                                             starting_col,
                                             next_col,
-                                            start_point.y) + row_margin
+                                            start_point_y) + row_margin
             y = y_base + (next_idx * y_margin)
         else:
-            y = start_point.y
+            y = start_point_y
 
         # Add vertical segment, moving downward
-        edge.add_coord(Point(start_point.x, y))
-
-        prev_scene_pt = Point(start_point.x, y)
-        curr_scene_pt = Point(0, 0)
-        # For each point on the edge's line segments
-        for pt_idx, pt_edge_coord in enumerate(edge.points[1:-1]):
-            if pt_edge_coord.col == prev_grid_coord.col:
-                assert pt_edge_coord.row != prev_grid_coord.row
+        edge.add_coord(start_point_x, y)
+
+        # Scene coordinates of the previous point
+        prev_x = start_point_x
+        prev_y = y
+        # Routing assigns an end index to every edge
+        assert edge.end_index is not None
+
+        # For each point on the edge's line segments, except the first and last
+        penultimate_idx = len(points) - 2
+        for pt_idx in range(1, penultimate_idx + 1):
+            pt_edge_coord = points[pt_idx]
+            if pt_edge_coord.col == prev_col:
+                assert pt_edge_coord.row != prev_row
                 # Vertical
-                curr_scene_pt.x = prev_scene_pt.x
+                x = prev_x
 
-                prev_row = pt_edge_coord.row-1
-                base_y = (grid_coords[GridIndex(pt_edge_coord.col, prev_row)].y +
-                          row_heights[prev_row] +
+                above_row = pt_edge_coord.row-1
+                base_y = (grid_ys[above_row + 1] +
+                          row_heights[above_row] +
                           row_margin)
 
                 # If this is the penultimate point
-                if pt_idx + 1 == len(edge.points) - 2:
-                    curr_scene_pt.y = base_y
+                if pt_idx == penultimate_idx:
+                    y = base_y
                 else:
-                    # We add (+1) to fix the off-by-one index,
-                    # and another (+1) to get the next point's grid coordinates
-                    next_coord = edge.points[pt_idx + 1 + 1]
-                    curr_scene_pt.y = base_y + (next_coord.idx + y_margin)
-            elif pt_edge_coord.row == prev_grid_coord.row:
-                assert pt_edge_coord.col != prev_grid_coord.col
+                    next_coord = points[pt_idx + 1]
+                    y = base_y + (next_coord.idx + y_margin)
+            elif pt_edge_coord.row == prev_row:
+                assert pt_edge_coord.col != prev_col
                 # Horizonal
                 # If this is the penultimate point
-                if pt_idx + 1 == len(edge.points) - 2:
-                    base_x = dst_loc.x + dst_size.width // 2
-                    assert edge.end_index is not None
-                    curr_scene_pt.x = base_x + (edge.end_index * x_margin)
+                if pt_idx == penultimate_idx:
+                    base_x = node_center_xs[edge.dst]
+                    x = base_x + (edge.end_index * x_margin)
                 else:
-                    # We add (+1) to fix the off-by-one index,
-                    # and another (+1) to get the next point's grid coordinates
-                    next_coord = edge.points[pt_idx + 1 + 1]
-                    base_x = grid_coords[GridIndex(pt_edge_coord.col, pt_edge_coord.row)].x
-                    curr_scene_pt.x = base_x + (next_coord.idx * x_margin)
+                    next_coord = points[pt_idx + 1]
+                    base_x = grid_xs[pt_edge_coord.col + 1]
+                    x = base_x + (next_coord.idx * x_margin)
 
-                curr_scene_pt.y = prev_scene_pt.y
+                y = prev_y
             else:
-                # Verify we didn't reach an unexpected case
-                assert False
+                # Consecutive points always share a column or a row
+                raise AssertionError(f'Edge point {pt_edge_coord} is not in line with the previous point')
 
-            edge.add_coord(curr_scene_pt)
+            edge.add_coord(x, y)
 
             # Update the previous point grid coordinates and scene coordinates
-            prev_grid_coord = GridIndex(pt_edge_coord.col, pt_edge_coord.row)
-            prev_scene_pt = dataclasses.replace(curr_scene_pt)
+            prev_col = pt_edge_coord.col
+            prev_row = pt_edge_coord.row
+            prev_x = x
+            prev_y = y
 
         # Handle the last point. It will always be at the top of the destination node.
         assert edge.max_end_index is not None
-        base_x = dst_loc.x + dst_size.width // 2 - (x_margin * (edge.max_end_index + 1) // 2)
-        end_edge_coord = edge.points[-1]
+        base_x = node_center_xs[edge.dst] - (x_margin * (edge.max_end_index + 1) // 2)
+        end_edge_coord = points[-1]
         x = base_x + (end_edge_coord.idx * x_margin)
-        if x != prev_scene_pt.x:
+        if x != prev_x:
             # Move horizontally if needed
-            edge.add_coord(Point(x, prev_scene_pt.y))
-        end_point = Point(x, dst_loc.y - y_margin)
-        edge.add_coord(end_point)
+            edge.add_coord(x, prev_y)
+        edge.add_coord(x, dst_loc.y - y_margin)
+        edge.finish_coords()
 
     edge_coords: Dict[Edge, List[Point]] = {Edge(e.src, e.dst): e.coordinates for e in edges}
 
@@ -1,10 +1,22 @@
-from typing import Optional, TextIO
+from collections import deque
+from itertools import groupby
+from typing import Deque, Optional, TextIO, Tuple
 
+from PySide6.QtCore import QThread, QTimer
 from PySide6.QtWidgets import QTextEdit
 from PySide6.QtGui import QColor
 import PySide6.QtGui as QtGui
+from shiboken6 import isValid
 
 class LogOut:
+  # Messages written by all streams since their text edits were last updated,
+  # shared so that e.g. stdout and stderr stay interleaved in the order written
+  _pending: Deque[Tuple['LogOut', str]] = deque()
+  # Whether a flush of the pending messages has been scheduled and not run yet,
+  # and the text edit it was scheduled with
+  _flush_scheduled: bool = False
+  _flush_context: Optional[QTextEdit] = None
+
   def __init__(self,
                text_edit: QTextEdit,
                alt_out: TextIO,
@@ -14,6 +26,49 @@ class LogOut:
     self.color = color
 
   def write(self, msg):
+    # Every insert reflows the text edit, so add all of the messages written
+    # before the event loop gets back to us in one go
+    LogOut._pending.append((self, msg))
+    # NB: The flush runs in the thread of the text edit it is scheduled with, even
+    #     when written to from another thread, and is dropped if that text edit is
+    #     destroyed first. It is then scheduled again with the next write.
+    if (not LogOut._flush_scheduled or not isValid(LogOut._flush_context)) and isValid(self.text_edit):
+      LogOut._flush_scheduled = True
+      LogOut._flush_context = self.text_edit
+      QTimer.singleShot(0, self.text_edit, LogOut._flush_pending)
+
+    # Pass on msg to alternate stream
+    if self.alt_out:
+      self.alt_out.write(msg)
+
+  def flush(self):
+    # Text edits may only be updated from their own thread, other threads
+    # leave the pending messages to the scheduled flush
+    if isValid(self.text_edit) and QThread.currentThread() == self.text_edit.thread():
+      LogOut._flush_pending()
+
+    if self.alt_out:
+      self.alt_out.flush()
+
+  @staticmethod
+  def _flush_pending():
+    # Cleared first, so that a message written while flushing schedules another flush
+    LogOut._flush_scheduled = False
+    LogOut._flush_context = None
+
+    # Only take the messages that are pending now, other threads may still be appending
+    pending = LogOut._pending
+    msgs = [pending.popleft() for _ in range(len(pending))]
+
+    # Consecutive messages from the same stream are inserted together
+    for out, out_msgs in groupby(msgs, key=lambda p: p[0]):
+      out._insert(''.join(msg for _, msg in out_msgs))
+
+  def _insert(self, msg):
+    # The text edit may already be deleted, e.g. when flushed at exit
+    if not isValid(self.text_edit):
+      return
+
     orig_color = self.text_edit.textColor()
     if self.color:
       self.text_edit.setTextColor(self.color)
@@ -23,7 +78,3 @@ class LogOut:
 
     if self.color:
       self.text_edit.setTextColor(orig_color)
-
-    # Pass on msg to alternate stream
-    if self.alt_out:
-      self.alt_out.write(msg)
@@ -46,11 +46,13 @@ class BasicBlock:
         return self.start_addr >= other.start_addr
 
     def __eq__(self, other):
+        if not isinstance(other, BasicBlock):
+            return NotImplemented
         return self.start_addr == other.start_addr
     
     def __hash__(self):
-        return id(self)
-    # hash(self.start_addr)
+        # Must agree with __eq__, blocks at the same address are the same node
+        return hash(self.start_addr)
 
     def __str__(self):
         return f'{hex(self.start_addr)}\n{self.data}'
@@ -1,13 +1,17 @@
+import logging
+
 from PySide6.QtCore import Qt, QLineF, QPoint, QPointF, QRect, QRectF
-from PySide6.QtGui import QBrush, QColor, QMouseEvent, QPainter, QPainterPath, QPen
-from PySide6.QtWidgets import QWidget, QGraphicsItem, QGraphicsPathItem, QGraphicsTextItem, QGraphicsRectItem, QStyleOptionGraphicsItem, QTextEdit
+from PySide6.QtGui import QBrush, QColor, QFont, QMouseEvent, QPainter, QPainterPath, QPainterPathStroker, QPen, QPolygonF, QStaticText, QTransform
+from PySide6.QtWidgets import QWidget, QGraphicsItem, QGraphicsScene, QStyleOptionGraphicsItem
 from networkx import DiGraph
-from typing import Any, List, Type, TypeAlias, Callable
+from typing import Any, Dict, List, Tuple, Type, TypeAlias, Callable
 
 from .graphics import InteractiveGraphicsView
 import ember.graph.layout as graph_layout
 from ember.graph.layout import NodeSize, Point
 
+log = logging.getLogger(__name__)
+
 def toQPoint(p: Point) -> QPoint:
     return QPoint(p.x, p.y)
 
@@ -18,20 +22,28 @@ class FlowGraphNode(QGraphicsItem):
 
     minimum_width: float = 300.0
     minimum_height: float = 50.0
+    # Space around the text, the same as the document margin of a QGraphicsTextItem
+    text_margin: float = 4.0
+    # Shared by all nodes
+    _brush: QBrush = QBrush(QColor(50, 50, 50))
+    _pen: QPen = QPen(Qt.black)
     
     def __init__(self,
                  data: Any,
                  ):
         super().__init__()
         self.data = data
-        self.text = QGraphicsTextItem(str(data))
-        text_rect = self.text.boundingRect()
-        self.width = max(text_rect.width(), self.minimum_width)
-        self.height = min(text_rect.height(), self.minimum_height)
+        # The text is laid out once and drawn from its cached layout on every paint.
+        # NB: QStaticText only breaks lines on line separators, not on newlines.
+        self.text = QStaticText(str(data).replace('\n', '\u2028'))
+        self.text.setTextFormat(Qt.PlainText)
+        self.text.prepare(QTransform(), QFont())
+        text_size = self.text.size()
+        self.width = max(text_size.width() + 2 * self.text_margin, self.minimum_width)
+        self.height = min(text_size.height() + 2 * self.text_margin, self.minimum_height)
         self._bounding_rect = QRectF(0.0, 0.0, self.width, self.height)
-        self.rect = QGraphicsRectItem(0.0, 0.0, self.width, self.height)
-        self.rect.setBrush(QBrush(QColor(50, 50, 50)))
-        self.text.setZValue(1.0)
+        # The contents never change, let Qt reuse the rendered node while panning
+        self.setCacheMode(QGraphicsItem.DeviceCoordinateCache)
 
     def boundingRect(self) -> QRectF:
         # TODO: Should this be centered within the block instead of (0, 0)?
@@ -41,13 +53,19 @@ class FlowGraphNode(QGraphicsItem):
               painter: QPainter,
               _option: QStyleOptionGraphicsItem,
               _widget: QWidget):
-        self.rect.paint(painter, _option, _widget)
-        self.text.paint(painter, _option, _widget)
+        # NB: The text is drawn with the pen of the outline
+        painter.setPen(self._pen)
+        painter.setBrush(self._brush)
+        painter.drawRect(self._bounding_rect)
+        painter.drawStaticText(QPointF(self.text_margin, self.text_margin), self.text)
 
         
 # TODO: This may eventually become an empty base class that is extended for custom edge drawing.
 class FlowGraphEdge(QGraphicsItem):
 
+    # Pens shared by all edges, keyed by color and width
+    _pens: Dict[Tuple[int, float], QPen] = {}
+
     def __init__(self,
                  src: QGraphicsItem,
                  dst: QGraphicsItem,
@@ -59,26 +77,41 @@ class FlowGraphEdge(QGraphicsItem):
         """
         super().__init__()
 
-        self.path: QPainterPath = QPainterPath(pts[0])
-        for pt in pts[1:]:
-            self.path.lineTo(pt)
-        self.pathItem: QGraphicsPathItem = QGraphicsPathItem(self.path)
+        # Add all points as one open subpath rather than a lineTo call per point
+        self.path: QPainterPath = QPainterPath()
+        self.path.addPolygon(QPolygonF(pts))
 
         self.color: QColor = color
         self.width: float = width
-        self.pathItem.setPen(QPen(self.color, self.width, Qt.SolidLine, Qt.FlatCap, Qt.BevelJoin))
+        self.pen: QPen = self._pen(self.color, self.width)
+        # The outline of the stroked path, as a QGraphicsPathItem would compute it
+        stroker = QPainterPathStroker(self.pen)
+        self._bounding_rect = stroker.createStroke(self.path).controlPointRect()
 
         self.src = src
         self.dst = dst
 
+        # Edges do not move once created, let Qt reuse the rendered path while panning
+        self.setCacheMode(QGraphicsItem.DeviceCoordinateCache)
+
+    @classmethod
+    def _pen(cls, color: QColor, width: float) -> QPen:
+        key = (QColor(color).rgba(), width)
+        pen = cls._pens.get(key)
+        if pen is None:
+            pen = cls._pens[key] = QPen(color, width, Qt.SolidLine, Qt.FlatCap, Qt.BevelJoin)
+        return pen
+
     def boundingRect(self) -> QRectF:
-        return self.pathItem.boundingRect()
+        return self._bounding_rect
 
     def paint(self,
               painter: QPainter,
               option: QStyleOptionGraphicsItem,
               widget: QWidget):
-        self.pathItem.paint(painter, option, widget)
+        painter.setPen(self.pen)
+        painter.setBrush(Qt.NoBrush)
+        painter.drawPath(self.path)
 
         
 class FlowGraphWidget(InteractiveGraphicsView):
@@ -97,21 +130,54 @@ class FlowGraphWidget(InteractiveGraphicsView):
         self._edge_ctor = edge_ctor
         self._sort_node_on = sort_node_on
 
+        # The items currently in the scene, kept across reloads
+        self._node_items: Dict[Node, FlowGraphNode] = {}
+        self._edge_items: List[FlowGraphEdge] = []
+
         self.setVerticalScrollBarPolicy(Qt.ScrollBarAsNeeded)
         self.setHorizontalScrollBarPolicy(Qt.ScrollBarAsNeeded)
 
+    def _reset_scene(self):
+        super()._reset_scene()
+        self._node_items.clear()
+        self._edge_items.clear()
+
     def reload(self):
-        self._reset_scene()
+        if not self.scene():
+            self._reset_scene()
 
         # Setup graph in scene
         # TODO: Replace placeholder
         scene = self.scene()
         if not scene:
             return
-        
-        scene_nodes = {n: self._node_ctor(n) for n in self._graph.nodes()}
-        for n in scene_nodes.values():
-            scene.addItem(n)
+
+        # Every item is added and positioned below, index them once at the end instead of on
+        # each insert and move.
+        index_method = scene.itemIndexMethod()
+        scene.setItemIndexMethod(QGraphicsScene.NoIndex)
+
+        # Keep the items of nodes that are still in the graph, only replacing those of
+        # nodes that were removed or are now a different object.
+        stale_node_items = self._node_items
+        self._node_items = {}
+        for n in self._graph.nodes():
+            item = stale_node_items.pop(n, None)
+            if item is None or item.data is not n:
+                if item is not None:
+                    scene.removeItem(item)
+                item = self._node_ctor(n)
+                scene.addItem(item)
+            self._node_items[n] = item
+        for item in stale_node_items.values():
+            scene.removeItem(item)
+
+        # The route of every edge may change with any change to the graph
+        for item in self._edge_items:
+            scene.removeItem(item)
+        self._edge_items.clear()
+
+        scene_nodes = self._node_items
 
         def rect_to_size(r: QRectF) -> NodeSize:
             return NodeSize(int(r.width()), int(r.height()))
@@ -122,7 +188,7 @@ class FlowGraphWidget(InteractiveGraphicsView):
 
         layout_result, edges = graph_layout.layout(self._graph, node_sizes, self._sort_node_on)
 
-        print(edges)
+        log.debug('Edges: %s', edges)
 
         for n, pt in layout_result.nodes.items():
             scene_nodes[n].setPos(QPointF(float(pt.x), float(pt.y)))
@@ -131,10 +197,13 @@ class FlowGraphWidget(InteractiveGraphicsView):
             qpts = [QPointF(pt.x, pt.y) for pt in pts]
             fge = self._edge_ctor(e.src, e.dst, qpts)
             scene.addItem(fge)
+            self._edge_items.append(fge)
+
+        scene.setItemIndexMethod(index_method)
 
     def mousePressEvent(self, event: QMouseEvent) -> None:
         super().mousePressEvent(event)
-        print(event)
+        log.debug('Mouse press: %s', event)
 
     def setGraph(self, g: DiGraph) -> None:
         self._graph = g
@@ -6,8 +6,8 @@ Several classes are based on equivalent code in angr management. Thank you, angr
 
 from typing import Optional
 from PySide6.QtWidgets import QApplication, QGraphicsScene, QGraphicsView, QGraphicsSceneMouseEvent, QStyleOptionGraphicsItem
-from PySide6.QtCore import QPointF, Qt, QEvent, QMarginsF, QPoint, QRectF, QSize, Signal
-from PySide6.QtGui import QImage, QKeyEvent, QMouseEvent, QPainter, QPointingDevice, QVector2D, QWheelEvent
+from PySide6.QtCore import QPointF, Qt, QEvent, QMarginsF, QPoint, QRect, QRectF, QSize, QTimer, Signal
+from PySide6.QtGui import QImage, QKeyEvent, QMouseEvent, QPainter, QPointingDevice, QTransform, QWheelEvent
 
 class BaseGraphicsView(QGraphicsView):
     """
@@ -17,11 +17,33 @@ class BaseGraphicsView(QGraphicsView):
 
     scene_rect_changed = Signal(QRectF)
 
+    # Rasterize the scene with OpenGL instead of on the CPU. Off by default since
+    # the view stays blank where no OpenGL context can be created.
+    OPENGL_VIEWPORT = False
+
     def __init__(self, parent=None):
         super().__init__(parent=parent)
         self._scene_rect: QRectF = QRectF()
+        # The viewport geometry and transform the scene rect was mapped from
+        self._viewport_geometry: QRect = QRect()
+        self._viewport_transform: QTransform = QTransform()
+        # Set while a `scene_rect_changed` emission is queued
+        self._scene_rect_dirty: bool = False
         self._is_extra_render_pass: bool = False
 
+        # Let Qt choose between repainting each dirty region and their bounding rect,
+        # depending on how many regions changed
+        self.setViewportUpdateMode(QGraphicsView.SmartViewportUpdate)
+
+        if self.OPENGL_VIEWPORT:
+            # Only imported when used, so views without it neither load QtOpenGL nor need it
+            from PySide6.QtOpenGLWidgets import QOpenGLWidget
+            self.setViewport(QOpenGLWidget())
+            # Every item sets the pen and brush it paints with and no view antialiases,
+            # so skip saving painter state and padding exposed regions for each item
+            self.setOptimizationFlag(QGraphicsView.DontSavePainterState, True)
+            self.setOptimizationFlag(QGraphicsView.DontAdjustForAntialiasing, True)
+
     @property
     def scene_rect(self):
         return self._scene_rect
@@ -47,13 +69,29 @@ class BaseGraphicsView(QGraphicsView):
             scene.update(self.sceneRect())
 
     def viewportEvent(self, event:QEvent) -> bool:
-        scene_rect = self.mapToScene(self.viewport().geometry()).boundingRect()
-        if scene_rect != self._scene_rect:
-            self._scene_rect = scene_rect
-            self.scene_rect_changed.emit(scene_rect)
+        # Most events (e.g. mouse moves) neither resize nor move the viewport,
+        # only map it to the scene again when it did
+        viewport_geometry = self.viewport().geometry()
+        viewport_transform = self.viewportTransform()
+        if viewport_geometry != self._viewport_geometry or viewport_transform != self._viewport_transform:
+            self._viewport_geometry = viewport_geometry
+            self._viewport_transform = viewport_transform
+            scene_rect = self.mapToScene(viewport_geometry).boundingRect()
+            if scene_rect != self._scene_rect:
+                self._scene_rect = scene_rect
+                # Coalesce the changes made while handling a batch of events (e.g. a drag)
+                # into one emission of the latest rect. The view is the timer's context,
+                # so the emission is dropped if the view is destroyed before it.
+                if not self._scene_rect_dirty:
+                    self._scene_rect_dirty = True
+                    QTimer.singleShot(0, self, self._flush_scene_rect)
 
         return super().viewportEvent(event)
 
+    def _flush_scene_rect(self):
+        self._scene_rect_dirty = False
+        self.scene_rect_changed.emit(self._scene_rect)
+
     def save_image_to(self, path, left_margin=50, top_margin=50, right_margin=50, bottom_margin=50):
         """
         Save the scene to an image.
@@ -90,6 +128,8 @@ class InteractiveGraphicsView(BaseGraphicsView):
 
     ZOOM_X = True
     ZOOM_Y = True
+    # How the scene created by `_reset_scene()` indexes its items
+    INDEX_METHOD = QGraphicsScene.BspTreeIndex
 
     def __init__(self, zoom_enabled=True, parent=None):
         super().__init__(parent=parent)
@@ -132,6 +172,7 @@ class InteractiveGraphicsView(BaseGraphicsView):
             self.scene().clear()
         else:
             scene = QGraphicsScene(self)
+            scene.setItemIndexMethod(self.INDEX_METHOD)
             self.setScene(scene)
 
     def sizeHint(self):
@@ -219,8 +260,9 @@ class InteractiveGraphicsView(BaseGraphicsView):
     def mouseMoveEvent(self, event: QMouseEvent) -> None:
         SENSITIVITY = 1.0
         if self._is_mouse_pressed:
-            mouse_delta = QVector2D(event.pos() - self._last_screen_pos).length() #type: ignore
-            if mouse_delta > SENSITIVITY:
+            # Compare squared distances, there is no need for the length itself
+            mouse_delta = event.pos() - self._last_screen_pos #type: ignore
+            if mouse_delta.x() * mouse_delta.x() + mouse_delta.y() * mouse_delta.y() > SENSITIVITY * SENSITIVITY:
                 self._is_dragging = True
                 scene_pos = self.mapToScene(event.pos())
 
@@ -234,17 +276,21 @@ class InteractiveGraphicsView(BaseGraphicsView):
 
         super().mouseMoveEvent(event)
 
-    def dispatchMouseMoveEventToScene(self, event):
+    def dispatchMouseMoveEventToScene(self, event, event_type=None):
         """
         Send unhandled events to the underlying scene.
+
+        The scene event type is derived from the type of `event`, unless
+        `event_type` is given.
         """
 
-        if event.type() == QEvent.MouseButtonPress:
-            event_type = QEvent.GraphicsSceneMousePress
-        elif event.type() == QEvent.MouseButtonRelease:
-            event_type = QEvent.GraphicsSceneMouseRelease
-        else:
-            raise ValueError(f'Unexpected event type {event.type()}')
+        if event_type is None:
+            if event.type() == QEvent.MouseButtonPress:
+                event_type = QEvent.GraphicsSceneMousePress
+            elif event.type() == QEvent.MouseButtonRelease:
+                event_type = QEvent.GraphicsSceneMouseRelease
+            else:
+                raise ValueError(f'Unexpected event type {event.type()}')
 
         # Pulled from angr management,
         # which pulled from QGraphicsView::mousePressEvent in Qt5
@@ -281,22 +327,11 @@ class InteractiveGraphicsView(BaseGraphicsView):
                 self.viewport().setCursor(Qt.ArrowCursor)
                 event.accept()
 
-        if not event.isAccepted():
-            gen_press_event = QMouseEvent(QEvent.MouseButtonPress,
-                                          event.pos(),
-                                          event.globalPos(),
-                                          event.button(),
-                                          event.buttons(),
-                                          event.modifiers())
-            _ = self.dispatchMouseMoveEventToScene(gen_press_event)
-
-            gen_release_event = QMouseEvent(QEvent.MouseButtonRelease,
-                                            event.pos(),
-                                            event.globalPos(),
-                                            event.button(),
-                                            event.buttons(),
-                                            event.modifiers())
-            release_event = self.dispatchMouseMoveEventToScene(gen_release_event)
+        if not event.isAccepted() and self.scene():
+            # Replay the click on the scene straight from the release event,
+            # rather than building a press and a release QMouseEvent for it
+            _ = self.dispatchMouseMoveEventToScene(event, QEvent.GraphicsSceneMousePress)
+            release_event = self.dispatchMouseMoveEventToScene(event, QEvent.GraphicsSceneMouseRelease)
 
             if not release_event.isAccepted():
                 # TODO: This is from angr management, but method isn't defined
@@ -1,56 +1,138 @@
+from bisect import bisect_left, bisect_right
 from dataclasses import dataclass
-from typing import List, Union
-from random import randint
-import random
+import logging
+from typing import Iterator, List, Optional, Tuple, Union
 
-from PySide6.QtCore import Qt, QRectF
+from PySide6.QtCore import Qt, QLineF, QPointF, QRectF
 from PySide6.QtGui import QBrush, QColor, QPainter, QPen
-from PySide6.QtWidgets import QGraphicsItem, QGraphicsLineItem, QGraphicsRectItem, QGraphicsScene, QStyleOptionGraphicsItem, QWidget
+from PySide6.QtWidgets import QGraphicsItem, QGraphicsScene, QStyleOptionGraphicsItem, QWidget
 
 from .graphics import InteractiveGraphicsView
 
+log = logging.getLogger(__name__)
+
+# Margins alternate between these patterns so the margins of adjacent depths stand apart
+_MARGIN_PATTERNS = (Qt.SolidPattern, Qt.Dense1Pattern)
+_MARGIN_COLORS = ((130, 230, 130),
+                  (120, 220, 220),
+                  (240, 180, 110),
+                  (180, 160, 240),
+                  (240, 140, 170),
+                  (230, 230, 120),
+                  (140, 180, 250),
+                  (200, 240, 160))
+
+@dataclass(frozen=True, slots=True)
 class TraceEntry:
-    def __init__(self,
-                 start_addr: int,
-                 data: str):
-        self.start_addr = start_addr
-        self.data = data
+    start_addr: int
+    data: str
 
+@dataclass(frozen=True, slots=True)
 class TraceContext:
-    def __init__(self,
-                 name: str,
-                 entries: List[Union[TraceEntry, 'TraceContext']]):
-        self.name = name
-        self.entries = entries
-
-class TraceItem(QGraphicsItem):
-    def __init__(self,
-                 trace_entry: TraceEntry,
-                 width: float,
-                 height: float,
-                 parent=None):
+    name: str
+    # A tuple so that a context can be shared between traces without being changed
+    entries: Tuple[Union[TraceEntry, 'TraceContext'], ...]
+
+def _extent(rects: List[QRectF]) -> QRectF:
+    """
+    The bounding rect of non-overlapping rects, sorted by their y-position.
+    """
+
+    if not rects:
+        return QRectF()
+    return QRectF(QPointF(min(r.left() for r in rects), rects[0].top()),
+                  QPointF(max(r.right() for r in rects), rects[-1].bottom()))
+
+class TraceListItem(QGraphicsItem):
+    """
+    All of the rows of a trace, drawn by a single item.
+
+    Each row is a body rect for a trace entry and a divider
+    underneath, and each nested context has a margin rect alongside
+    all of its rows. Rows are drawn with one batched call per pen/brush instead of
+    one scene item per rect or line, and only the rows that were
+    exposed are drawn. Rows must be sorted from top to bottom.
+    """
+
+    # Shared by all rows
+    _brush: QBrush = QBrush(QColor(50, 50, 50))
+    _pen: QPen = QPen(QColor(10, 10, 10), 3)
+    _margin_pen: QPen = QPen(Qt.NoPen)
+    _divider_pen: QPen = QPen(QColor(150, 150, 150))
+    # Below this level of detail the outline and divider of a row are thinner
+    # than a pixel, rows are drawn as plain fills instead
+    _outline_min_lod: float = 0.25
+
+    def __init__(self, parent=None):
         super().__init__(parent=parent)
-        self._trace_entry: trace_entry = trace_entry
-        self.width = width
-        self.height = height
-        self.rect = QGraphicsRectItem(0.0, 0.0, width, height)
-        self.rect.setBrush(QColor(50, 50, 50))
-        self._pen = QPen(QColor(10, 10, 10))
-        self._pen.setWidth(3)
-        self.rect.setPen(self._pen)
+        self._trace_entries: List[TraceEntry] = []
+        self._rects: List[QRectF] = []
+        # Margin rects grouped by brush
+        self._margin_rects: List[Tuple[QBrush, List[QRectF]]] = []
+        self._dividers: List[QLineF] = []
+        self._bounding_rect = QRectF()
+        # Paint only needs to draw the rows within the exposed rect
+        self.setFlag(QGraphicsItem.ItemUsesExtendedStyleOption)
+        # Scrolling reuses the rendered rows, only the newly exposed ones are painted.
+        # NB: Qt clips the cache to the viewport when the item is larger than the view.
+        self.setCacheMode(QGraphicsItem.DeviceCoordinateCache)
+
+    def set_rows(self,
+                 trace_entries: List[TraceEntry],
+                 rects: List[QRectF],
+                 margin_rects: List[Tuple[QBrush, List[QRectF]]],
+                 dividers: List[QLineF]) -> None:
+        """
+        Replace the rows, given as parallel lists of the entry, body rect and
+        divider of each row, plus the margin rects grouped by brush. The margin
+        rects of a brush must not overlap.
+        """
+
+        self.prepareGeometryChange()
+        self._trace_entries = trace_entries
+        self._rects = rects
+        self._margin_rects = margin_rects
+        self._dividers = dividers
+        # Also drops the cached rendering of the previous rows
+        self.update()
+
+        half_pen_width = self._pen.widthF() / 2
+        bounding_rect = _extent(rects).adjusted(-half_pen_width, -half_pen_width, half_pen_width, half_pen_width)
+        for _, brush_rects in margin_rects:
+            bounding_rect |= _extent(brush_rects)
+        self._bounding_rect = bounding_rect
 
     def boundingRect(self) -> QRectF:
-        pen_width = self._pen.width()
-        return QRectF(0.0, 0.0, self.width + pen_width, self.height + pen_width)
+        return self._bounding_rect
 
     def paint(self,
               painter: QPainter,
-              _option: QStyleOptionGraphicsItem,
+              option: QStyleOptionGraphicsItem,
               _widget: QWidget):
-        # painter.drawText(boundingRect.center(), hex(self._trace_entry.start_addr))
-        boundingRect = self.boundingRect()
-        self.rect.paint(painter, _option, _widget)
+        # The rows are sorted by y-position, find the range of them that was exposed
+        exposed_top = option.exposedRect.top()
+        exposed_bottom = option.exposedRect.bottom()
+        half_pen_width = self._pen.widthF() / 2
+
+        lo = bisect_right(self._rects, exposed_top, key=lambda r: r.bottom() + half_pen_width)
+        hi = bisect_left(self._rects, exposed_bottom, key=lambda r: r.top() - half_pen_width)
+        lod = option.levelOfDetailFromTransform(painter.worldTransform())
+        is_outlined = lod >= self._outline_min_lod
+        painter.setPen(self._pen if is_outlined else Qt.NoPen)
+        painter.setBrush(self._brush)
+        painter.drawRects(self._rects[lo:hi])
 
+        painter.setPen(self._margin_pen)
+        for margin_brush, margin_rects in self._margin_rects:
+            margin_lo = bisect_right(margin_rects, exposed_top, key=QRectF.bottom)
+            margin_hi = bisect_left(margin_rects, exposed_bottom, key=QRectF.top)
+            painter.setBrush(margin_brush)
+            painter.drawRects(margin_rects[margin_lo:margin_hi])
+
+        # Each divider is drawn along the bottom of the body rect of its row
+        if is_outlined:
+            painter.setPen(self._divider_pen)
+            painter.drawLines(self._dividers[lo:hi])
 
 class TraceWidget(InteractiveGraphicsView):
     """
@@ -61,6 +143,21 @@ class TraceWidget(InteractiveGraphicsView):
     the `reload()` method should be called.
     """
 
+    # The trace is drawn by a single item and never hit-tested by position,
+    # so there is nothing for a BSP tree to speed up.
+    INDEX_METHOD = QGraphicsScene.NoIndex
+
+    # Geometry shared by every row of the trace
+    ROW_WIDTH: float = 500.0
+    ROW_HEIGHT: float = 100.0
+    DIVIDER_HEIGHT: float = 6.0
+    # How far each nested context is indented
+    CONTEXT_MARGIN: float = 50.0
+    # The margin brush of the contexts nested at each depth, reused cyclically.
+    # Shared by all trace widgets.
+    _depth_brushes: Tuple[QBrush, ...] = tuple(QBrush(QColor(*rgb), bs=_MARGIN_PATTERNS[depth & 1])
+                                               for depth, rgb in enumerate(_MARGIN_COLORS))
+
     def __init__(self, trace: TraceContext, parent=None):
         super().__init__(parent=parent)
 
@@ -68,80 +165,84 @@ class TraceWidget(InteractiveGraphicsView):
         #       this widget construct the TraceItem/QGraphicsItem
         #       that corresponds to it. This gives us a place to
         #       make global decisions.
-        self._trace: List[TraceContext] = trace
+        self._trace: TraceContext = trace
+        # The item drawing the trace, kept across reloads
+        self._trace_item: Optional[TraceListItem] = None
+
+    def _reset_scene(self):
+        super()._reset_scene()
+        self._trace_item = None
 
     def load_context(self,
-                     scene: QGraphicsScene,
-                     margin_brushes: List[QBrush],
+                     trace_item: TraceListItem,
                      y_pos: float,
                      x_left: float,
                      x_right: float,
                      x_pos: float,
                      ctx: TraceContext) -> float:
-        DIVIDER_HEIGHT = 6
-        MARGIN_PEN = QPen()
-        MARGIN_PEN.setStyle(Qt.NoPen)
-        PATTERNS = [Qt.SolidPattern,
-                    Qt.Dense1Pattern,
-                    Qt.Dense2Pattern,
-                    Qt.Dense3Pattern,
-                    Qt.Dense4Pattern,
-                    Qt.Dense5Pattern,
-                    Qt.Dense6Pattern,
-                    Qt.Dense7Pattern,
-                    Qt.HorPattern,
-                    Qt.VerPattern,
-                    Qt.CrossPattern,
-                    Qt.BDiagPattern,
-                    Qt.FDiagPattern,
-                    Qt.DiagCrossPattern]
-
-        for entry in ctx.entries:
-            if isinstance(entry, TraceContext):
-                # Make recursive call to load nested context
-                x_margin: float = 50.0
-                prev_margin_brushes = margin_brushes.copy()
-                margin_brushes.append(QBrush(QColor(randint(100, 255), randint(100, 255), randint(100, 255)),
-                                             bs=random.choice(PATTERNS[:2])))
-                y_pos = self.load_context(scene, margin_brushes, y_pos, x_left, x_right, x_pos + x_margin, entry)
-                margin_brushes = prev_margin_brushes
-            else:
-                # Position and add the items to the scene
-                width = 500.0
-                height = 100.0
-                item = TraceItem(entry, width, height)
-                item.setPos(x_pos, y_pos)
-                scene.addItem(item)
-
-                # Draw margin
-                # The width of the rect drawn for each of the contexts
-                margin_ctx_width = (x_pos - x_left) / len(margin_brushes) if margin_brushes else 0.0
-                for idx, margin_brush in enumerate(margin_brushes):
-                    margin_rect = QGraphicsRectItem(QRectF(0.0,
-                                                           0.0,
-                                                           margin_ctx_width,
-                                                           height + DIVIDER_HEIGHT))
-                    # margin_rect.setZValue(1.0)
-                    margin_rect.setPos(x_left + (margin_ctx_width * idx), y_pos)
-                    margin_rect.setPen(MARGIN_PEN)
-                    margin_rect.setBrush(margin_brush)
-                    scene.addItem(margin_rect)
+        # Every row has the same shape, only the position of a row depends on the
+        # context it is in
+        width = self.ROW_WIDTH
+        height = self.ROW_HEIGHT
+        depth_brushes = self._depth_brushes
+
+        # The rows, collected in one pass and handed to the item at the end
+        trace_entries: List[TraceEntry] = []
+        rects: List[QRectF] = []
+        dividers: List[QLineF] = []
+        # The margins of the nested contexts at each depth, starting at depth 1.
+        # A margin spans all of the rows of its context, nested contexts included.
+        margin_rects: List[List[QRectF]] = []
+
+        # The contexts being loaded, innermost last, with the x-position of their rows
+        # and the y-position their first row starts at
+        stack: List[Tuple[Iterator[Union[TraceEntry, TraceContext]], float, float]] = [
+            (iter(ctx.entries), x_pos, y_pos)]
+        while stack:
+            entries, x_pos, _ = stack[-1]
+            for entry in entries:
+                if isinstance(entry, TraceContext):
+                    # Load the nested context before the rest of this one
+                    stack.append((iter(entry.entries), x_pos + self.CONTEXT_MARGIN, y_pos))
+                    break
+
+                # Position the row
+                trace_entries.append(entry)
+                rects.append(QRectF(x_pos, y_pos, width, height))
 
                 # Advance y-position
                 y_pos += height
 
-                # Draw the segment divider
-                divider = QGraphicsLineItem(x_pos, y_pos, x_pos + width, y_pos)
-                divider.setPen(QPen(QColor(150, 150, 150)))
-                scene.addItem(divider)
+                # The segment divider
+                dividers.append(QLineF(x_pos, y_pos, x_pos + width, y_pos))
 
                 # Update the location for the next item
-                y_pos += DIVIDER_HEIGHT
+                y_pos += self.DIVIDER_HEIGHT
+            else:
+                # Every entry of the innermost context is loaded, draw its margin
+                # alongside all of its rows
+                _, ctx_x_pos, ctx_y_pos = stack.pop()
+                depth = len(stack)
+                if depth and y_pos > ctx_y_pos:
+                    # The width of the rect drawn for each of the contexts
+                    margin_ctx_width = (ctx_x_pos - x_left) / depth
+                    if len(margin_rects) < depth:
+                        margin_rects.extend([] for _ in range(depth - len(margin_rects)))
+                    margin_rects[depth - 1].append(QRectF(x_left + (margin_ctx_width * (depth - 1)),
+                                                          ctx_y_pos,
+                                                          margin_ctx_width,
+                                                          y_pos - ctx_y_pos))
 
+        trace_item.set_rows(trace_entries,
+                            rects,
+                            [(depth_brushes[idx % len(depth_brushes)], depth_rects)
+                             for idx, depth_rects in enumerate(margin_rects) if depth_rects],
+                            dividers)
         return y_pos
 
     def reload(self) -> None:
-        self._reset_scene()
+        if not self.scene():
+            self._reset_scene()
 
         scene = self.scene()
         if not scene:
@@ -149,7 +250,7 @@ class TraceWidget(InteractiveGraphicsView):
 
         # Viewport rect in scene coords
         viewport_rect = self.mapToScene(self.viewport().geometry()).boundingRect()
-        print(f'Viewport rect: {viewport_rect}')
+        log.debug('Viewport rect: %s', viewport_rect)
 
         width = 500.0
         height = 300.0
@@ -161,6 +262,10 @@ class TraceWidget(InteractiveGraphicsView):
         y_top: float = viewport_rect.y()
         y_pos: float = y_top
 
-        print(f'x_left: {x_left}, x_right: {x_right}')
+        log.debug('x_left: %s, x_right: %s', x_left, x_right)
 
-        self.load_context(scene, [], y_pos, x_left, x_right, x_left, self._trace)
+        # Reuse the item of the previous load, only its rows are replaced
+        if self._trace_item is None:
+            self._trace_item = TraceListItem()
+            scene.addItem(self._trace_item)
+        self.load_context(self._trace_item, y_pos, x_left, x_right, x_left, self._trace)
@@ -1,3 +1,4 @@
+from functools import cache
 import sys
 from typing import cast, List
 
@@ -14,6 +15,50 @@ from .log import LogOut
 from ember.plugin.ghidra.main import DemoGraph
 
 
+# The trace shown in the trace view, it is only read so every window shares it
+_DEMO_TRACE = TraceContext('A',
+                           (TraceEntry(0x0, 'a'),
+                            TraceEntry(0x4, 'b'),
+                            TraceContext('B',
+                                         (TraceEntry(0x10, 'a'),
+                                          TraceEntry(0x14, 'b'),
+                                          TraceEntry(0x18, 'c'),
+                                          TraceContext('C',
+                                                       (TraceEntry(0x20, 'a'),
+                                                        TraceContext('D',
+                                                                     (TraceEntry(0x30, 'a'),
+                                                                      TraceEntry(0x34, 'b'))),
+                                                        TraceEntry(0x24, 'b'),
+                                                        TraceEntry(0x28, 'c'))),
+                                          TraceEntry(0x1c, 'd'))),
+                            TraceEntry(0x8, 'c'),
+                            TraceEntry(0xc, 'd'),
+                            TraceContext('BB',
+                                         (TraceEntry(0x10, 'a'),
+                                          TraceEntry(0x14, 'b'),
+                                          TraceEntry(0x18, 'c')))))
+
+
+@cache
+def _build_demo_graph() -> DiGraph:
+    """The graph shown in the graph view, built once and shared by every window.
+    Layout only reads the graph, so it must not be changed.
+    """
+    g = DiGraph()
+    g.add_edge('a', 'b')
+    g.add_edge('a', 'c')
+    g.add_edge('b', 'd')
+    g.add_edge('c', 'd')
+    g.add_edge('d', 'e')
+    g.add_edge('b', 'e')
+    # g.add_edge(e, e)
+    # g.add_edge(e, c)
+    # g.add_edge(c, e)
+    g.add_edge('e', 'f')
+    g.add_edge('d', 'f')
+    return g
+
+
 class EmberWindow(QMainWindow):
     def __init__(self):
         super().__init__()
@@ -30,44 +75,10 @@ class EmberWindow(QMainWindow):
         log_dock_w = QDockWidget("Log")
         log_dock_w.setWidget(log_w)
 
-        g = DiGraph()
-        g.add_edge('a', 'b')
-        g.add_edge('a', 'c')
-        g.add_edge('b', 'd')
-        g.add_edge('c', 'd')
-        g.add_edge('d', 'e')
-        g.add_edge('b', 'e')
-        # g.add_edge(e, e)
-        # g.add_edge(e, c)
-        # g.add_edge(c, e)
-        g.add_edge('e', 'f')
-        g.add_edge('d', 'f')
-
-        graph_w = FlowGraphWidget(g)
+        graph_w = FlowGraphWidget(_build_demo_graph())
         graph_w.reload()
 
-        trace = TraceContext('A',
-                             [TraceEntry(0x0, 'a'),
-                              TraceEntry(0x4, 'b'),
-                              TraceContext('B',
-                                           [TraceEntry(0x10, 'a'),
-                                            TraceEntry(0x14, 'b'),
-                                            TraceEntry(0x18, 'c'),
-                                            TraceContext('C',
-                                                         [TraceEntry(0x20, 'a'),
-                                                          TraceContext('D',
-                                                                       [TraceEntry(0x30, 'a'),
-                                                                        TraceEntry(0x34, 'b')]),
-                                                          TraceEntry(0x24, 'b'),
-                                                          TraceEntry(0x28, 'c')]),
-                                            TraceEntry(0x1c, 'd')]),
-                              TraceEntry(0x8, 'c'),
-                              TraceEntry(0xc, 'd'),
-                              TraceContext('BB',
-                                           [TraceEntry(0x10, 'a'),
-                                            TraceEntry(0x14, 'b'),
-                                            TraceEntry(0x18, 'c')])])
-        trace_w = TraceWidget(trace)
+        trace_w = TraceWidget(_DEMO_TRACE)
         trace_w.reload()
 
         
@@ -82,6 +93,4 @@ class EmberWindow(QMainWindow):
         self.setCentralWidget(tab_w)
         self.addDockWidget(Qt.BottomDockWidgetArea, log_dock_w)
 
-        self.addDockWidget(Qt.BottomDockWidgetArea, log_dock_w)
-
         self.show()